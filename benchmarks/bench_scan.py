@@ -0,0 +1,271 @@
+"""
+Benchmark the synchronous scan (IAM.Login, OCVP.ScanRegions, SDDCResolver)
+against the asyncio engine on a synthetic tenancy.
+
+A local aiohttp server emulates the Identity, OCVP and Resource Search
+endpoints of every region with a fixed latency per request, and the SDK
+region endpoints are pointed at it. Both paths sign every request with a
+real security token signer and must produce the same hosts, donors and SDDCs.
+The structured search is paged, and in the first -missing-regions regions
+listing the ESXi hosts of one compartment returns a 404. With -throttle, the
+first request for each compartment listing, SDDC and search page of a region
+is answered with a 429 and a Retry-After header, so the retry paths of both
+engines are covered too.
+
+    python benchmarks/bench_scan.py -regions 200 -compartments 10 -latency 20
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+import oci
+from aiohttp import web
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocimodules.IAM import Login  # noqa: E402
+from ocimodules.OCVP import SDDCResolver, ScanRegions  # noqa: E402
+from ocimodules.asyncscan import AsyncOCIEngine, AsyncLogin, AsyncScanRegions, AsyncPrefetchSDDCs  # noqa: E402
+
+TENANCY = "ocid1.tenancy.oc1..benchtenancy"
+
+
+#################################################
+#              Synthetic tenancy
+#################################################
+class SyntheticTenancy:
+
+    def __init__(self, regions, compartments, hosts, sddcs, sddc_compartments, donors, page_size, missing_regions, latency, throttle=False):
+        self.regions = ["bench-region-{}".format(i) for i in range(regions)]
+        self.compartments = ["ocid1.compartment.oc1..bench{}".format(i) for i in range(compartments)]
+        self.hosts = hosts
+        self.sddcs = sddcs
+        self.sddc_compartments = sddc_compartments
+        self.donors = donors
+        self.page_size = page_size
+        self.missing_regions = set(self.regions[:missing_regions])
+        self.latency = latency
+        self.throttle = throttle
+        self.throttled_urls = set()
+        self.requests = 0
+        self.run = ""
+
+    def host(self, region, i):
+        host = {
+            "id": "ocid1.vmwareesxihost.oc1.{}.host{}".format(region, i),
+            "displayName": "{}-esxi-{}".format(region, i),
+            "sddcId": self.sddc(region, i % self.sddcs)["id"],
+            "compartmentId": self.sddc(region, i % self.sddcs)["compartmentId"],
+            "lifecycleState": "ACTIVE",
+            "currentCommitment": "MONTH",
+            "nextCommitment": "MONTH",
+            "hostShapeName": "BM.DenseIO2.52",
+            "hostOcpuCount": 52,
+            "timeCreated": "2025-01-01T00:00:00.000Z",
+            "billingContractEndDate": "2027-01-01T00:00:00.000Z",
+        }
+        return host
+
+    def sddc(self, region, i):
+        return {
+            "id": "ocid1.vmwaresddc.oc1.{}.sddc{}".format(region, i),
+            "displayName": "{}-sddc-{}".format(region, i),
+            "compartmentId": self.compartments[i % self.sddc_compartments],
+        }
+
+    def routes(self):
+        return [
+            web.get("/{region}/20160918/compartments", self.list_compartments),
+            web.get("/{region}/20230701/esxiHosts", self.list_esxi_hosts),
+            web.get("/{region}/20230701/esxiHosts/{id}", self.get_esxi_host),
+            web.get("/{region}/20230701/sddcs", self.list_sddcs),
+            web.get("/{region}/20230701/sddcs/{id}", self.get_sddc),
+            web.post("/{region}/20180409/resources", self.search_resources),
+        ]
+
+    async def respond(self, data, status=200, headers=None):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return web.json_response(data, status=status, headers=headers)
+
+    async def throttled(self, request):
+        """429 for the first request of each URL when throttling, separately for each run"""
+        key = (self.run, request.method, str(request.rel_url))
+        if not self.throttle or key in self.throttled_urls:
+            return None
+        self.throttled_urls.add(key)
+        return await self.respond({"code": "TooManyRequests", "message": "Too many requests"}, status=429,
+                                  headers={"retry-after": "1"})
+
+    async def list_compartments(self, request):
+        throttled = await self.throttled(request)
+        if throttled:
+            return throttled
+        if request.query["compartmentId"] != TENANCY:
+            return await self.respond([])
+        return await self.respond([
+            {"id": c, "name": "comp{}".format(i), "compartmentId": TENANCY, "lifecycleState": "ACTIVE"}
+            for i, c in enumerate(self.compartments)
+        ])
+
+    async def list_esxi_hosts(self, request):
+        region = request.match_info["region"]
+        compartment = request.query["compartmentId"]
+        if region in self.missing_regions and compartment == self.compartments[len(self.compartments) // 2]:
+            return await self.respond({"code": "NotFound", "message": "Not found"}, status=404)
+        items = []
+        if compartment in self.compartments and self.compartments.index(compartment) < self.donors:
+            donor = self.host(region, 1000 + self.compartments.index(compartment))
+            donor["compartmentId"] = compartment
+            items.append(donor)
+        return await self.respond({"items": items})
+
+    async def get_esxi_host(self, request):
+        region = request.match_info["region"]
+        return await self.respond(self.host(region, int(request.match_info["id"].rsplit("host", 1)[1])))
+
+    async def list_sddcs(self, request):
+        throttled = await self.throttled(request)
+        if throttled:
+            return throttled
+        region = request.match_info["region"]
+        sddcs = [self.sddc(region, i) for i in range(self.sddcs)]
+        return await self.respond({"items": [sddc for sddc in sddcs if sddc["compartmentId"] == request.query["compartmentId"]]})
+
+    async def get_sddc(self, request):
+        throttled = await self.throttled(request)
+        if throttled:
+            return throttled
+        region = request.match_info["region"]
+        return await self.respond(self.sddc(region, int(request.match_info["id"].rsplit("sddc", 1)[1])))
+
+    async def search_resources(self, request):
+        throttled = await self.throttled(request)
+        if throttled:
+            return throttled
+        region = request.match_info["region"]
+        start = int(request.query.get("page", 0))
+        end = min(start + self.page_size, self.hosts)
+        headers = {"opc-next-page": str(end)} if end < self.hosts else None
+        return await self.respond({"items": [
+            {"identifier": self.host(region, i)["id"], "resourceType": "VmwareEsxiHost"} for i in range(start, end)
+        ]}, headers=headers)
+
+
+def start_server(tenancy):
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.add_routes(tenancy.routes())
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0, backlog=4096)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return port
+
+
+def point_endpoints_at(port):
+    """Route every service endpoint of a region to http://127.0.0.1:port/<region>"""
+    def endpoint_for(service, region=None, endpoint=None, **kwargs):
+        return "http://127.0.0.1:{}/{}".format(port, region)
+    oci.regions.endpoint_for = endpoint_for
+
+
+def create_signer():
+    """A security token signer, as used with Instance Principals and Delegation Tokens"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return oci.auth.signers.SecurityTokenSigner("bench-token", key)
+
+
+#################################################
+#              Runs
+#################################################
+def run_sync(config, signer, regions):
+    compartments = Login(config, signer, TENANCY)
+    esxi_hosts, esxi_donor_hosts = ScanRegions(config, signer, regions, compartments)
+    get_sddc = SDDCResolver(config, signer)
+    get_sddc.prefetch(esxi_hosts)
+    return compartments, esxi_hosts, esxi_donor_hosts, get_sddc
+
+
+def run_async(config, signer, regions, engine_args):
+    async def run():
+        async with AsyncOCIEngine(config, signer, **engine_args) as engine:
+            compartments = await AsyncLogin(engine, config, TENANCY)
+            esxi_hosts, esxi_donor_hosts = await AsyncScanRegions(engine, regions, compartments)
+            get_sddc = SDDCResolver(config, signer)
+            await AsyncPrefetchSDDCs(engine, get_sddc, esxi_hosts)
+            return compartments, esxi_hosts, esxi_donor_hosts, get_sddc
+
+    return asyncio.run(run())
+
+
+def summary(result):
+    """The table contents, SDDC names are looked up like the row building does"""
+    compartments, esxi_hosts, esxi_donor_hosts, get_sddc = result
+    return (
+        [(c.fullpath, c.level) for c in compartments],
+        [(h.id, h.display_name, getattr(get_sddc(h.sddc_id), "display_name", "")) for h in esxi_hosts],
+        [(h.id, h.compartment_id) for h in esxi_donor_hosts],
+    )
+
+
+def timed(tenancy, run, fn, *args):
+    tenancy.run = run
+    start_requests = tenancy.requests
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args)
+    return result, time.perf_counter() - start, tenancy.requests - start_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the synchronous scan against the asyncio engine")
+    parser.add_argument("-regions", type=int, default=200)
+    parser.add_argument("-compartments", type=int, default=10)
+    parser.add_argument("-hosts", type=int, default=8, help="ESXi hosts per region")
+    parser.add_argument("-sddcs", type=int, default=4, help="SDDCs per region")
+    parser.add_argument("-sddc-compartments", type=int, default=1, dest="sddc_compartments", help="compartments holding the SDDCs of a region")
+    parser.add_argument("-donors", type=int, default=1, help="compartments with a billing donor host per region")
+    parser.add_argument("-page-size", type=int, default=5, dest="page_size", help="structured search results per page")
+    parser.add_argument("-missing-regions", type=int, default=2, dest="missing_regions", help="regions returning a 404 for one compartment")
+    parser.add_argument("-latency", type=float, default=20, help="latency per request in ms")
+    parser.add_argument("-throttle", action="store_true", help="answer the first request for each listing, SDDC and search page with a 429")
+    parser.add_argument("-connections", type=int, default=64, help="async connection pool size")
+    parser.add_argument("-skip-sync", action="store_true", dest="skip_sync")
+    args = parser.parse_args()
+
+    tenancy = SyntheticTenancy(args.regions, args.compartments, args.hosts, args.sddcs, args.sddc_compartments, args.donors,
+                               args.page_size, args.missing_regions, args.latency / 1000, args.throttle)
+    point_endpoints_at(start_server(tenancy))
+    signer = create_signer()
+    config = {"region": tenancy.regions[0], "tenancy": TENANCY}
+    engine_args = {"max_connections": args.connections, "max_connections_per_host": args.connections}
+
+    print("Synthetic tenancy: {} regions x {} compartments, {} hosts/region, {} ms latency".format(
+        args.regions, args.compartments + 1, args.hosts, args.latency))
+
+    async_result, async_time, async_requests = timed(tenancy, "async", run_async, dict(config), signer, tenancy.regions, engine_args)
+    print("async: {:8.2f}s  {:6d} requests  {:8.1f} req/s".format(async_time, async_requests, async_requests / async_time))
+
+    if not args.skip_sync:
+        sync_result, sync_time, sync_requests = timed(tenancy, "sync", run_sync, dict(config), signer, tenancy.regions)
+        print("sync:  {:8.2f}s  {:6d} requests  {:8.1f} req/s".format(sync_time, sync_requests, sync_requests / sync_time))
+        print("speedup: {:.1f}x".format(sync_time / async_time))
+        if summary(sync_result) != summary(async_result):
+            print("ERROR: the synchronous and asyncio results differ")
+            sys.exit(1)
+        print("Results are identical")
+        for name, result in (("async", async_result), ("sync", sync_result)):
+            print("{} {}".format(name, result[3].summary()))
+
+
+if __name__ == "__main__":
+    main()
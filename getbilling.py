@@ -4,10 +4,11 @@ import csv
 from datetime import date, datetime
 import oci
 import requests
-import re
 
 from ocimodules.functions import input_command_line, create_signer, check_oci_version, MyWriter
 from ocimodules.IAM import GetCompartments, Login, SubscribedRegions, GetHomeRegion, GetCompartmentFullPath
+from ocimodules.OCVP import region_from_ocid, SDDCResolver, ScanRegions
+from ocimodules.asyncscan import RunAsyncLogin, RunAsyncScan
 
 # Disable OCI CircuitBreaker feature
 oci.circuit_breaker.NoCircuitBreakerStrategy()
@@ -23,60 +24,6 @@ application_version = "25.02.2026"
 # functions
 ############################################
 
-def region_from_ocid(ocid):
-    """
-    Extract region from an OCID.
-    OCID format: ocid1.<resource>.<realm>.<region>.<unique_id>
-    """
-    if not ocid:
-        return ""
-    parts = ocid.split(".")
-    if len(parts) >= 4:
-        return parts[3]
-    m = re.search(r"ocid1\.\w+\.\w+\.(.+?)\.", ocid)
-    return m.group(1) if m else ""
-
-
-def GetSDDCByOCID(config, signer):
-    """
-    Returns a function that looks up an SDDC by its OCID.
-    Uses an in-memory cache to avoid redundant lookups.
-    Automatically adjusts config['region'] based on OCID.
-    """
-
-    cache = {}
-
-    def extract_region_from_ocid(ocid):
-        """
-        OCID format: ocid1.<resource>.<realm>.<region>.<unique_id>
-        Example: ocid1.sddc.oc1.eu-frankfurt-1.<unique_id>
-        """
-        parts = ocid.split(".")
-        if len(parts) >= 4:
-            return parts[3]
-        # fallback for non-standard formats
-        m = re.search(r"ocid1\.\w+\.\w+\.(.+?)\.", ocid)
-        if m:
-            return m.group(1)
-        return None
-
-    def lookup(sddc_ocid):
-        if sddc_ocid in cache:
-            return cache[sddc_ocid]
-        region = extract_region_from_ocid(sddc_ocid)
-        if region:
-            config["region"] = region
-        ocvp = oci.ocvp.SddcClient(config, signer=signer)
-        try:
-            sddc = ocvp.get_sddc(sddc_ocid).data
-            cache[sddc_ocid] = sddc
-            return sddc
-        except Exception as e:
-            print(f"Error retrieving SDDC for OCID {sddc_ocid}: {e}")
-            return None
-
-    return lookup
-
 def print_table(headers, rows, table_name=None):
     """Print a text table without external dependencies. If table_name is provided, also save the table as a CSV file (filename: table_name_YYYYMMDD_HHMMSS.csv)."""
     if not rows:
@@ -129,10 +76,13 @@ if cmd.log_file != "":
 #################################################
 # oci config and "login" check
 ######################################################
-config, signer = create_signer(cmd.config_profile, cmd.is_instance_principals, cmd.is_delegation_token)
+config, signer = create_signer(cmd.config_profile, cmd.is_instance_principals, cmd.is_delegation_token, cmd.token_cache)
 tenant_id = config['tenancy']
 
-compartments= Login(config, signer, tenant_id)
+if cmd.use_async:
+    compartments = RunAsyncLogin(config, signer, tenant_id)
+else:
+    compartments= Login(config, signer, tenant_id)
 
 print(f"Current configured region is: {config['region']}")
 print("Do you want to get overview against this region only, or all subscribed regions?")
@@ -148,53 +98,12 @@ else:
     selected_regions = SubscribedRegions(config, signer)
     print("Proceeding with all subscribed regions:")
 
-esxi_hosts = []
-esxi_donor_hosts = []
-for region in selected_regions:
-    config["region"] = region
-
-    ocvp = oci.ocvp.EsxiHostClient(config, signer=signer)
-    skip_region = False
-    for c in compartments:
-        print("Scanning " + region + ": compartments for unused billing terms (billing donors): " + c.fullpath + "                 ", end="\r")
-        try:
-            for host in oci.pagination.list_call_get_all_results(
-                    ocvp.list_esxi_hosts,
-                    compartment_id=c.details.id,
-                    is_billing_donors_only=True,
-                ).data:
-                print("billing donor found: " + host.display_name)
-                esxi_donor_hosts.append(host)
-        except Exception as e:
-            # Check if it's an OCI ServiceError and status is 404
-            if hasattr(e, "status") and e.status == 404:
-                # print(f"Region {config['region']} returned 404 (Not Found). Skipping region.")
-                skip_region = True
-                break
-            else:
-                print(f"Error retrieving ESXi hosts for region {config['region']}: {e}")
-    if not skip_region:
-        search_client = oci.resource_search.ResourceSearchClient(config, signer=signer)
-        structured_search_details = oci.resource_search.models.StructuredSearchDetails(
-            query="query vmwareesxihost resources",
-            type="Structured"
-        )
-
-        print("Searching for all ESXi hosts using structured query...                                   ", end="\r")
-        try:
-            search_result = search_client.search_resources(structured_search_details)
-            esxi_hosts_search = search_result.data.items
-            for host in esxi_hosts_search:
-                try:
-                    # identifier is assumed to be the ESXi host OCID
-                    detailed_host = ocvp.get_esxi_host(host.identifier).data
-                    esxi_hosts.append(detailed_host)
-                except Exception as detail_e:
-                    print(f"Error retrieving details for ESXi Host {host.identifier}: {detail_e}")
-
-
-        except Exception as e:
-            print(f"Error during structured search for ESXi hosts: {e}")
+get_sddc = SDDCResolver(config, signer)
+if cmd.use_async:
+    esxi_hosts, esxi_donor_hosts = RunAsyncScan(config, signer, selected_regions, compartments, get_sddc)
+else:
+    esxi_hosts, esxi_donor_hosts = ScanRegions(config, signer, selected_regions, compartments)
+    get_sddc.prefetch(esxi_hosts)
 
 ###################################
 # print results
@@ -216,7 +125,6 @@ TABLE_HEADERS = [
     "Days left",
 ]
 rows = []
-get_sddc = GetSDDCByOCID(config, signer)
 
 for host in esxi_hosts:
     # Region from the host's OCID (source of truth), not from config or host.region
@@ -295,6 +203,7 @@ for host in esxi_hosts:
 
 print("\nESXi Host Billing Table:\n")
 print_table(TABLE_HEADERS, rows, table_name="esxi_host_billing")
+print(get_sddc.summary())
 
 if not esxi_donor_hosts:
     print("No donor hosts found")
@@ -0,0 +1,209 @@
+import concurrent.futures
+import oci
+import re
+import threading
+
+# Concurrent SDDC lookups of SDDCResolver.prefetch
+MaxWorkers = 8
+
+
+#################################################
+#              region_from_ocid
+#################################################
+def region_from_ocid(ocid):
+    """
+    Extract region from an OCID.
+    OCID format: ocid1.<resource>.<realm>.<region>.<unique_id>
+    """
+    if not ocid:
+        return ""
+    parts = ocid.split(".")
+    if len(parts) >= 4:
+        return parts[3]
+    m = re.search(r"ocid1\.\w+\.\w+\.(.+?)\.", ocid)
+    return m.group(1) if m else ""
+
+
+#################################################
+#              SDDCResolver
+#################################################
+class SDDCResolver:
+    """
+    Resolves the SDDCs of the ESXi hosts up front so the table rows only
+    need in-memory lookups.
+    prefetch() groups the distinct SDDC OCIDs per region and fetches them
+    concurrently, using one list_sddcs per host compartment when a region
+    has fewer compartments than SDDCs. Listed SddcSummary objects are
+    converted to Sddc, so lookups always return an Sddc (fields only in
+    the full Sddc are None for listed ones).
+    Calling the resolver returns the SDDC for an OCID, or None if it could
+    not be retrieved. Failed fetches are not cached, a lookup that is not
+    in the cache falls back to a blocking get_sddc.
+    Counters: prefetched SDDCs (those of the hosts, not every listed one),
+    cache hits, misses (fetched on demand) and failed lookups (blank SDDC
+    name in the table).
+    """
+
+    def __init__(self, config, signer, max_workers=MaxWorkers):
+        self.config = config
+        self.signer = signer
+        self.max_workers = max_workers
+        self.cache = {}
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+        self.failed = 0
+        self.local = threading.local()
+
+    def __call__(self, sddc_ocid):
+        if sddc_ocid in self.cache:
+            self.hits += 1
+            return self.cache[sddc_ocid]
+        self.misses += 1
+        sddc = self.get_sddc(sddc_ocid)
+        if sddc is None:
+            self.failed += 1
+        else:
+            self.cache[sddc_ocid] = sddc
+        return sddc
+
+    def region(self, sddc_ocid):
+        return region_from_ocid(sddc_ocid) or self.config["region"]
+
+    def plan(self, hosts):
+        """
+        Output - dictionary of region to (SDDC OCIDs to resolve, compartments
+        to list or an empty list to get the SDDCs one by one)
+        """
+        sddc_ids = {}
+        compartment_ids = {}
+        for host in hosts:
+            sddc_ocid = getattr(host, "sddc_id", "")
+            if not sddc_ocid or sddc_ocid in self.cache:
+                continue
+            region = self.region(sddc_ocid)
+            sddc_ids.setdefault(region, {})[sddc_ocid] = None
+            compartment_id = getattr(host, "compartment_id", "")
+            if compartment_id:
+                compartment_ids.setdefault(region, {})[compartment_id] = None
+
+        plan = {}
+        for region, ids in sddc_ids.items():
+            compartments = list(compartment_ids.get(region, {}))
+            plan[region] = (list(ids), compartments if 0 < len(compartments) < len(ids) else [])
+        return plan
+
+    def store(self, sddcs):
+        """Caches fetched or listed SDDCs, including listed ones no host needed yet"""
+        for sddc in sddcs:
+            if sddc is None:
+                continue
+            if isinstance(sddc, oci.ocvp.models.SddcSummary):
+                sddc = oci.ocvp.models.Sddc(**{name: getattr(sddc, name) for name in sddc.swagger_types})
+            self.cache[sddc.id] = sddc
+
+    def count_prefetched(self, plan):
+        """Counts the SDDCs of the plan that were resolved, listed SDDCs no host references are not counted"""
+        self.prefetched += sum(1 for ids, compartments in plan.values() for sddc_ocid in ids if sddc_ocid in self.cache)
+
+    def summary(self):
+        return "SDDC lookups: {} prefetched, {} cached, {} fetched on demand, {} failed (blank SDDC name)".format(
+            self.prefetched, self.hits, self.misses, self.failed)
+
+    def client(self, region):
+        # SDK clients are not shared between threads
+        if not hasattr(self.local, "clients"):
+            self.local.clients = {}
+        if region not in self.local.clients:
+            config = dict(self.config)
+            config["region"] = region
+            self.local.clients[region] = oci.ocvp.SddcClient(config, signer=self.signer)
+        return self.local.clients[region]
+
+    def get_sddc(self, sddc_ocid):
+        try:
+            return self.client(self.region(sddc_ocid)).get_sddc(sddc_ocid).data
+        except Exception as e:
+            print(f"Error retrieving SDDC for OCID {sddc_ocid}: {e}")
+            return None
+
+    def list_sddcs(self, region, compartment_id):
+        try:
+            return oci.pagination.list_call_get_all_results(self.client(region).list_sddcs, compartment_id=compartment_id).data
+        except Exception as e:
+            print(f"Error listing SDDCs in {region} for compartment {compartment_id}: {e}")
+            return []
+
+    def prefetch(self, hosts):
+        plan = self.plan(hosts)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            listed = [
+                executor.submit(self.list_sddcs, region, compartment_id)
+                for region, (ids, compartments) in plan.items()
+                for compartment_id in compartments
+            ]
+            for future in listed:
+                self.store(future.result())
+
+            # SDDCs not found by listing, or in regions where get is cheaper
+            remaining = [sddc_ocid for ids, compartments in plan.values() for sddc_ocid in ids if sddc_ocid not in self.cache]
+            self.store(executor.map(self.get_sddc, remaining))
+        self.count_prefetched(plan)
+
+
+#################################################
+#              ScanRegions
+# Input - regions and compartments to scan
+# Output - list of ESXi hosts and list of billing donor hosts
+#################################################
+def ScanRegions(config, signer, selected_regions, compartments):
+    esxi_hosts = []
+    esxi_donor_hosts = []
+    for region in selected_regions:
+        config["region"] = region
+
+        ocvp = oci.ocvp.EsxiHostClient(config, signer=signer)
+        skip_region = False
+        for c in compartments:
+            print("Scanning " + region + ": compartments for unused billing terms (billing donors): " + c.fullpath + "                 ", end="\r")
+            try:
+                for host in oci.pagination.list_call_get_all_results(
+                        ocvp.list_esxi_hosts,
+                        compartment_id=c.details.id,
+                        is_billing_donors_only=True,
+                    ).data:
+                    print("billing donor found: " + host.display_name)
+                    esxi_donor_hosts.append(host)
+            except Exception as e:
+                # Check if it's an OCI ServiceError and status is 404
+                if hasattr(e, "status") and e.status == 404:
+                    # print(f"Region {config['region']} returned 404 (Not Found). Skipping region.")
+                    skip_region = True
+                    break
+                else:
+                    print(f"Error retrieving ESXi hosts for region {config['region']}: {e}")
+        if not skip_region:
+            search_client = oci.resource_search.ResourceSearchClient(config, signer=signer)
+            structured_search_details = oci.resource_search.models.StructuredSearchDetails(
+                query="query vmwareesxihost resources",
+                type="Structured"
+            )
+
+            print("Searching for all ESXi hosts using structured query...                                   ", end="\r")
+            try:
+                esxi_hosts_search = oci.pagination.list_call_get_all_results(
+                    search_client.search_resources,
+                    structured_search_details,
+                ).data
+                for host in esxi_hosts_search:
+                    try:
+                        # identifier is assumed to be the ESXi host OCID
+                        detailed_host = ocvp.get_esxi_host(host.identifier).data
+                        esxi_hosts.append(detailed_host)
+                    except Exception as detail_e:
+                        print(f"Error retrieving details for ESXi Host {host.identifier}: {detail_e}")
+
+            except Exception as e:
+                print(f"Error during structured search for ESXi hosts: {e}")
+
+    return esxi_hosts, esxi_donor_hosts
@@ -0,0 +1,426 @@
+import asyncio
+import json
+import random
+import sys
+import time
+from urllib.parse import quote, urlencode
+
+import oci
+from oci._vendor import requests
+
+from ocimodules.IAM import OCICompartments, WaitRefresh
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:
+    aiohttp = None
+
+# Requests waiting for or using a connection
+MaxInFlight = 2000
+# Size of the shared connection pool, and per service endpoint
+MaxConnections = 64
+MaxConnectionsPerHost = 8
+# Retries for 429, 5xx, 409 IncorrectState/LockConflict and connection
+# errors, same budget as oci.retry.DEFAULT_RETRY_STRATEGY used by the SDK
+# clients: attempts, total time, exponential backoff with jitter. A
+# Retry-After header is honored.
+MaxAttempts = 8
+MaxElapsed = 600
+BaseSleep = 1
+MaxSleep = 30
+# Renew an SDK instance principals token off the event loop this many
+# seconds before it expires, so signing never blocks on the auth service
+TokenRefreshMargin = 120
+RequestTimeout = 120
+# Login only walks this deep, same as IAM.Login
+MaxCompartmentLevel = 7
+
+
+##########################################################################
+# AsyncOCIEngine
+# Sends OCI API requests over aiohttp, signed with the regular SDK signer.
+# The SDK clients are only used to resolve the region endpoints and to
+# (de)serialize the models, so the results are the same objects the
+# synchronous calls return.
+##########################################################################
+class AsyncOCIEngine:
+
+    def __init__(self, config, signer, max_in_flight=MaxInFlight, max_connections=MaxConnections,
+                 max_connections_per_host=MaxConnectionsPerHost, max_attempts=MaxAttempts):
+        if aiohttp is None:
+            print("The asyncio scan engine requires aiohttp, install it by running the command:")
+            print("pip install -r requirements-async.txt")
+            sys.exit(-1)
+        self.config = config
+        self.signer = signer
+        self.max_in_flight = max_in_flight
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.max_attempts = max_attempts
+        self.clients = {}
+        self.session = None
+        self.semaphore = None
+        self.refresh_lock = None
+        self.requests = 0
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.refresh_lock = asyncio.Lock()
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections_per_host)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=RequestTimeout))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    def client(self, client_class, region=None):
+        region = region or self.config["region"]
+        key = (client_class, region)
+        if key not in self.clients:
+            config = dict(self.config)
+            config["region"] = region
+            self.clients[key] = client_class(config, signer=self.signer).base_client
+        return self.clients[key]
+
+    async def call(self, client_class, region, method, resource_path, query_params=None, body=None, response_type=None):
+        """
+        Signs and sends one request, retrying throttled and failed requests.
+        Output - deserialized response data and the response headers
+        Raises oci.exceptions.ServiceError like the SDK does
+        """
+        base_client = self.client(client_class, region)
+        url = base_client.endpoint + resource_path
+        if query_params:
+            url += "?" + urlencode(base_client.process_query_params(query_params))
+        headers = {"accept": "application/json", "content-type": "application/json"}
+        data = json.dumps(base_client.sanitize_for_serialization(body)) if body is not None else None
+
+        start = time.monotonic()
+        attempt = 0
+        refreshed = False
+        while True:
+            attempt += 1
+            async with self.semaphore:
+                await self.renew_token()
+                # Sign as late as possible, the date header must be current when the request is sent
+                request = requests.Request(method, url, headers=headers, data=data).prepare()
+                self.signer(request)
+                token = self.current_token()
+                self.requests += 1
+                try:
+                    async with self.session.request(method, yarl.URL(request.url, encoded=True),
+                                                    headers=dict(request.headers), data=request.body) as response:
+                        status = response.status
+                        response_headers = response.headers
+                        content = await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status, response_headers, content = None, {}, str(e).encode("utf-8")
+                    error = e
+
+            # Refresh a rejected token once, like the SDK clients do for instance principals
+            if status == 401 and not refreshed and isinstance(self.signer, oci.auth.signers.InstancePrincipalsSecurityTokenSigner):
+                refreshed = True
+                async with self.refresh_lock:
+                    # Concurrent 401s share one refresh
+                    if self.current_token() == token:
+                        await asyncio.get_running_loop().run_in_executor(None, self.signer.refresh_security_token)
+                continue
+
+            if self.should_retry(status, content) and attempt < self.max_attempts:
+                sleep = min(MaxSleep, BaseSleep * 2 ** (attempt - 1)) + random.uniform(0, 1)
+                try:
+                    sleep = max(sleep, float(response_headers.get("retry-after", 0)))
+                except ValueError:
+                    pass
+                if time.monotonic() - start + sleep <= MaxElapsed:
+                    await asyncio.sleep(sleep)
+                    continue
+            break
+
+        if status is None:
+            raise error
+        if status >= 400:
+            try:
+                error = json.loads(content)
+            except ValueError:
+                error = {}
+            raise oci.exceptions.ServiceError(status, error.get("code", "Unknown"), dict(response_headers),
+                                              error.get("message", content.decode("utf-8", "replace")),
+                                              request_endpoint="{} {}".format(method, url))
+
+        data = base_client.deserialize_response_data(content, response_type) if response_type else None
+        return data, response_headers
+
+    def should_retry(self, status, content):
+        if status is None or status == 429 or status >= 500:
+            return True
+        if status == 409:
+            try:
+                return json.loads(content).get("code") in ("IncorrectState", "LockConflict")
+            except (ValueError, AttributeError):
+                return False
+        return False
+
+    def current_token(self):
+        """The token the signer signs with now, or will after its next reset"""
+        federation_client = getattr(self.signer, "federation_client", None)
+        if federation_client is not None and hasattr(federation_client, "security_token"):
+            return federation_client.security_token.security_token
+        return getattr(self.signer, "api_key", None)
+
+    async def renew_token(self):
+        """
+        The SDK instance principals signer fetches a new token while signing
+        once it is about to expire, a blocking call to the auth service.
+        Renew it in the executor ahead of time instead.
+        """
+        federation_client = getattr(self.signer, "federation_client", None)
+        if federation_client is None or not hasattr(federation_client, "security_token"):
+            return
+        if federation_client.security_token.valid_with_jitter(TokenRefreshMargin):
+            return
+        async with self.refresh_lock:
+            if not federation_client.security_token.valid_with_jitter(TokenRefreshMargin):
+                await asyncio.get_running_loop().run_in_executor(None, federation_client.refresh_security_token)
+
+    async def list_all(self, client_class, region, method, resource_path, query_params, response_type, body=None):
+        """Follows opc-next-page like oci.pagination.list_call_get_all_results"""
+        results = []
+        query_params = dict(query_params)
+        while True:
+            data, headers = await self.call(client_class, region, method, resource_path, query_params, body, response_type)
+            results.extend(data.items if hasattr(data, "items") else data)
+            if not headers.get("opc-next-page"):
+                return results
+            query_params["page"] = headers["opc-next-page"]
+
+    #################################################
+    # Operations, named after the SDK client methods
+    #################################################
+    async def get_user(self, user_id):
+        return (await self.call(oci.identity.IdentityClient, None, "GET", "/users/" + quote(user_id, safe=""), response_type="User"))[0]
+
+    async def get_compartment(self, compartment_id):
+        return (await self.call(oci.identity.IdentityClient, None, "GET", "/compartments/" + quote(compartment_id, safe=""), response_type="Compartment"))[0]
+
+    async def list_compartments(self, compartment_id):
+        return await self.list_all(oci.identity.IdentityClient, None, "GET", "/compartments",
+                                   {"compartmentId": compartment_id}, "list[Compartment]")
+
+    async def list_esxi_hosts(self, region, compartment_id, is_billing_donors_only=False):
+        query_params = {"compartmentId": compartment_id}
+        if is_billing_donors_only:
+            query_params["isBillingDonorsOnly"] = True
+        return await self.list_all(oci.ocvp.EsxiHostClient, region, "GET", "/esxiHosts", query_params, "EsxiHostCollection")
+
+    async def get_esxi_host(self, region, esxi_host_id):
+        return (await self.call(oci.ocvp.EsxiHostClient, region, "GET", "/esxiHosts/" + quote(esxi_host_id, safe=""), response_type="EsxiHost"))[0]
+
+    async def get_sddc(self, region, sddc_id):
+        return (await self.call(oci.ocvp.SddcClient, region, "GET", "/sddcs/" + quote(sddc_id, safe=""), response_type="Sddc"))[0]
+
+    async def list_sddcs(self, region, compartment_id):
+        return await self.list_all(oci.ocvp.SddcClient, region, "GET", "/sddcs", {"compartmentId": compartment_id}, "SddcCollection")
+
+    async def search_resources(self, region, search_details):
+        return await self.list_all(oci.resource_search.ResourceSearchClient, region, "POST", "/resources", {},
+                                   "ResourceSummaryCollection", body=search_details)
+
+
+#################################################
+#              AsyncGetCompartments
+#################################################
+async def AsyncGetCompartments(engine, rootID):
+    # Like IAM.GetCompartments, keep retrying while the API is busy
+    while True:
+        try:
+            return await engine.list_compartments(rootID)
+        except oci.exceptions.ServiceError as e:
+            if e.status == 429:
+                print("API busy.. retry", end="\r")
+                await asyncio.sleep(WaitRefresh)
+            else:
+                print("bad error!: " + e.message)
+                return []
+
+
+#################################################
+#              AsyncLogin
+# Same result as IAM.Login, the compartment tree is walked concurrently
+#################################################
+async def AsyncLogin(engine, config, startcomp, sso_user=False):
+    if "user" in config:
+        try:
+            user = await engine.get_user(config["user"])
+            print("Logged in as: {} @ {}".format(user.description, config["region"]))
+        except oci.exceptions.ServiceError as e:
+            if e.status == 404 and sso_user:
+                print("Warning: user not found — assuming SSO")
+            else:
+                raise e
+    else:
+        print("Logged in as: {} @ {}".format("InstancePrinciple/DelegationToken", config["region"]))
+
+    # Adding Start compartment
+    if "user" in config or ".tenancy." not in startcomp:
+        compartment = await engine.get_compartment(startcomp)
+    else:
+        # Bug fix - for working on root compartment using instance principle.
+        compartment = oci.identity.models.Compartment()
+        compartment.id = startcomp
+        compartment.name = "root compartment"
+        compartment.lifecycle_state = "ACTIVE"
+
+    newcomp = OCICompartments()
+    newcomp.details = compartment
+    newcomp.level = 0
+    newcomp.fullpath = "/root" if ".tenancy." in startcomp else compartment.name
+
+    async def walk(parent, level):
+        # Returns the active subcompartments of parent in the same order as IAM.Login
+        compartments = await AsyncGetCompartments(engine, parent.details.id)
+        children = []
+        for compartment in compartments:
+            if compartment.lifecycle_state == "ACTIVE":
+                child = OCICompartments()
+                child.details = compartment
+                child.fullpath = "{}/{}".format(parent.fullpath, compartment.name)
+                child.level = level
+                children.append(child)
+        if level < MaxCompartmentLevel:
+            subtrees = await asyncio.gather(*[walk(child, level + 1) for child in children])
+        else:
+            subtrees = [[] for child in children]
+
+        c = []
+        for child, subtree in zip(children, subtrees):
+            c.append(child)
+            c.extend(subtree)
+        return c
+
+    return [newcomp] + await walk(newcomp, 1)
+
+
+#################################################
+#              AsyncScanRegions
+# Same result as OCVP.ScanRegions, with all regions, compartments and
+# host lookups in flight at once
+#################################################
+async def AsyncScanRegions(engine, selected_regions, compartments):
+    structured_search_details = oci.resource_search.models.StructuredSearchDetails(
+        query="query vmwareesxihost resources",
+        type="Structured"
+    )
+
+    async def scan_region(region):
+        donors = []
+        hosts = []
+
+        # Probe with the first compartment, a 404 means OCVS is not available in the region
+        results = await asyncio.gather(
+            engine.list_esxi_hosts(region, compartments[0].details.id, is_billing_donors_only=True),
+            return_exceptions=True)
+        if not (isinstance(results[0], Exception) and getattr(results[0], "status", None) == 404):
+            results += await asyncio.gather(
+                *[engine.list_esxi_hosts(region, c.details.id, is_billing_donors_only=True) for c in compartments[1:]],
+                return_exceptions=True)
+
+        # Same as OCVP.ScanRegions: a 404 from any compartment skips the rest of the region
+        for result in results:
+            if isinstance(result, Exception):
+                if getattr(result, "status", None) == 404:
+                    return donors, hosts
+                print(f"Error retrieving ESXi hosts for region {region}: {result}")
+            else:
+                donors.append(result)
+
+        try:
+            esxi_hosts_search = await engine.search_resources(region, structured_search_details)
+        except Exception as e:
+            print(f"Error during structured search for ESXi hosts: {e}")
+            return donors, hosts
+
+        results = await asyncio.gather(
+            *[engine.get_esxi_host(region, host.identifier) for host in esxi_hosts_search],
+            return_exceptions=True)
+        for host, result in zip(esxi_hosts_search, results):
+            if isinstance(result, Exception):
+                print(f"Error retrieving details for ESXi Host {host.identifier}: {result}")
+            else:
+                hosts.append(result)
+        return donors, hosts
+
+    print("Scanning {} region(s) x {} compartment(s) for ESXi hosts and billing donors...".format(len(selected_regions), len(compartments)))
+    esxi_hosts = []
+    esxi_donor_hosts = []
+    for donors, hosts in await asyncio.gather(*[scan_region(region) for region in selected_regions]):
+        for page in donors:
+            for host in page:
+                print("billing donor found: " + host.display_name)
+                esxi_donor_hosts.append(host)
+        esxi_hosts.extend(hosts)
+
+    return esxi_hosts, esxi_donor_hosts
+
+
+#################################################
+#              AsyncPrefetchSDDCs
+# Fills the OCVP.SDDCResolver cache with the same plan as its prefetch()
+#################################################
+async def AsyncPrefetchSDDCs(engine, resolver, hosts):
+    plan = resolver.plan(hosts)
+
+    async def list_sddcs(region, compartment_id):
+        try:
+            resolver.store(await engine.list_sddcs(region, compartment_id))
+        except Exception as e:
+            print(f"Error listing SDDCs in {region} for compartment {compartment_id}: {e}")
+
+    async def get_sddc(region, sddc_id):
+        try:
+            resolver.store([await engine.get_sddc(region, sddc_id)])
+        except Exception as e:
+            # Not cached, the row lookup retries it
+            print(f"Error retrieving SDDC for OCID {sddc_id}: {e}")
+
+    await asyncio.gather(*[
+        list_sddcs(region, compartment_id)
+        for region, (ids, compartments) in plan.items()
+        for compartment_id in compartments
+    ])
+
+    # SDDCs not found by listing, or in regions where get is cheaper
+    await asyncio.gather(*[
+        get_sddc(region, sddc_id)
+        for region, (ids, compartments) in plan.items()
+        for sddc_id in ids
+        if sddc_id not in resolver.cache
+    ])
+    resolver.count_prefetched(plan)
+
+
+#################################################
+#              RunAsyncLogin / RunAsyncScan
+# Blocking entry points for getbilling.py
+#################################################
+def RunAsyncLogin(config, signer, startcomp, sso_user=False, **engine_args):
+    async def run():
+        async with AsyncOCIEngine(config, signer, **engine_args) as engine:
+            return await AsyncLogin(engine, config, startcomp, sso_user)
+
+    return asyncio.run(run())
+
+
+def RunAsyncScan(config, signer, selected_regions, compartments, sddc_resolver, **engine_args):
+    """
+    Output - list of ESXi hosts and list of billing donor hosts, the SDDCs
+    of the ESXi hosts are prefetched into sddc_resolver
+    """
+    async def run():
+        async with AsyncOCIEngine(config, signer, **engine_args) as engine:
+            esxi_hosts, esxi_donor_hosts = await AsyncScanRegions(engine, selected_regions, compartments)
+            await AsyncPrefetchSDDCs(engine, sddc_resolver, esxi_hosts)
+            return esxi_hosts, esxi_donor_hosts
+
+    return asyncio.run(run())
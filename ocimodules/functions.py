@@ -4,6 +4,8 @@ import os
 import sys
 import time
 
+from ocimodules.tokencache import DEFAULT_TOKEN_CACHE, GetCachedSigner
+
 ##########################################################################
 # input_command_line
 ##########################################################################
@@ -14,6 +16,8 @@ def input_command_line(help=False):
     parser.add_argument('-ip', action='store_true', default=False, dest='is_instance_principals', help='Use Instance Principals for Authentication')
     parser.add_argument('-dt', action='store_true', default=False, dest='is_delegation_token', help='Use Delegation Token for Authentication')
     parser.add_argument("-log", nargs='?', const='log.txt', default="", dest='log_file', help="Output also to logfile. If logfile not specified, will log to log.txt")
+    parser.add_argument('-async', action='store_true', default=False, dest='use_async', help='Use the asyncio scan engine (requires aiohttp)')
+    parser.add_argument("-tc", nargs='?', const=DEFAULT_TOKEN_CACHE, default="", dest='token_cache', help="Cache the Instance Principals/Delegation Token security token on disk and reuse it across runs. If file not specified, will use " + DEFAULT_TOKEN_CACHE)
 
     cmd = parser.parse_args()
 
@@ -32,13 +36,19 @@ def input_command_line(help=False):
 ##########################################################################
 # Create signer for Authentication
 # Input - config_profile and is_instance_principals and is_delegation_token
+#         optional token_cache file to reuse the security token across runs
 # Output - config and signer objects
 ##########################################################################
-def create_signer(config_profile, is_instance_principals, is_delegation_token):
+def create_signer(config_profile, is_instance_principals, is_delegation_token, token_cache=""):
 
     # if instance principals authentications
     if is_instance_principals:
         try:
+            if token_cache:
+                region, tenancy, signer = GetCachedSigner(token_cache, "instance_principal")
+                config = {'region': region, 'tenancy': tenancy}
+                return config, signer
+
             signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
             config = {'region': signer.region, 'tenancy': signer.tenancy_id}
             return config, signer
@@ -68,10 +78,14 @@ def create_signer(config_profile, is_instance_principals, is_delegation_token):
 
             with open(delegation_token_location, 'r') as delegation_token_file:
                 delegation_token = delegation_token_file.read().strip()
+
+            if token_cache:
+                signer = GetCachedSigner(token_cache, "delegation_token", delegation_token)[2]
+            else:
                 # get signer from delegation token
                 signer = oci.auth.signers.InstancePrincipalsDelegationTokenSigner(delegation_token=delegation_token)
 
-                return config, signer
+            return config, signer
 
         except KeyError:
             print("* Key Error obtaining delegation_token_file")
@@ -84,6 +98,8 @@ def create_signer(config_profile, is_instance_principals, is_delegation_token):
     # config file authentication
     # -----------------------------
     else:
+        if token_cache:
+            print("Warning: -tc only applies to Instance Principals (-ip) and Delegation Token (-dt) authentication, ignoring it")
         try:
             config = oci.config.from_file(
                 oci.config.DEFAULT_LOCATION,
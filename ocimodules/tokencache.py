@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+import time
+
+import oci
+from cryptography.hazmat.primitives import serialization
+from oci.auth.security_token_container import SecurityTokenContainer
+
+DEFAULT_TOKEN_CACHE = os.path.join(os.path.expanduser("~"), ".oci", "ocvs-billing-token-cache.json")
+
+# Stop reusing a cached token this many seconds before it expires
+ExpiryMargin = 300
+# Retry delay for a failed background refresh
+RefreshRetry = 30
+
+
+##########################################################################
+# CachedSecurityTokenSigner
+# Signs with a security token and session key from the token cache,
+# optionally adding the delegation (opc-obo) token like
+# InstancePrincipalsDelegationTokenSigner does.
+# It is an InstancePrincipalsSecurityTokenSigner so the SDK clients call
+# refresh_security_token() and retry when the token is rejected with a 401,
+# but it skips that class's constructor and never contacts the metadata or
+# auth endpoints itself, new tokens come from refresh().
+##########################################################################
+class CachedSecurityTokenSigner(oci.auth.signers.InstancePrincipalsSecurityTokenSigner):
+
+    def __init__(self, token, private_key, expires, region, tenancy_id, refresh, cache_file, delegation_token=None):
+        """
+        refresh() must return (token, private_key, expires) for a new token
+        and rewrite cache_file
+        """
+        self.region = region
+        self.tenancy_id = tenancy_id
+        self.expires = expires
+        self.refresh = refresh
+        self.cache_file = cache_file
+        self.delegation_token = delegation_token
+        self._reset_signers_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed = 0
+        self._refresh_timer = None
+        generic_headers = ["date", "(request-target)", "host"]
+        if delegation_token:
+            generic_headers.append("opc-obo-token")
+        oci.auth.signers.SecurityTokenSigner.__init__(self, token, private_key, generic_headers=generic_headers)
+
+    def __call__(self, request, enforce_content_headers=True):
+        # Bypass the federation client based token reset of the parent classes
+        return oci.signer.AbstractBaseSigner.__call__(self, request, enforce_content_headers)
+
+    def do_request_sign(self, request, enforce_content_headers=True):
+        if self.delegation_token:
+            request.headers['opc-obo-token'] = self.delegation_token
+        with self._reset_signers_lock:
+            super(CachedSecurityTokenSigner, self).do_request_sign(request, enforce_content_headers)
+        return request
+
+    def reset_token(self, token, private_key):
+        with self._reset_signers_lock:
+            self.api_key = oci.auth.signers.security_token_signer.SECURITY_TOKEN_FORMAT_STRING.format(token)
+            self.private_key = private_key
+            self._basic_signer.reset_signer(self.api_key, self.private_key)
+            self._body_signer.reset_signer(self.api_key, self.private_key)
+
+    def _refresh(self):
+        token, private_key, self.expires = self.refresh()
+        self.reset_token(token, private_key)
+        self._refreshed = time.time()
+
+    def refresh_security_token(self):
+        """
+        Called by the SDK clients when a request gets a 401. Gets and caches a
+        new token, concurrent callers share one refresh. If that fails the
+        cache file is removed so later runs do not reuse the rejected token.
+        """
+        with self._refresh_lock:
+            if time.time() - self._refreshed < RefreshRetry:
+                return
+            try:
+                self._refresh()
+            except Exception:
+                RemoveTokenCache(self.cache_file)
+                raise
+
+    def start_background_refresh(self):
+        """
+        Refresh the token on a daemon thread shortly before it expires.
+        Only matters for runs that outlive the token.
+        """
+        def run():
+            with self._refresh_lock:
+                try:
+                    self._refresh()
+                except Exception as e:
+                    print("Warning: background token refresh failed, retrying: {}".format(e))
+                    self.expires = time.time() + ExpiryMargin + RefreshRetry
+            self.start_background_refresh()
+
+        delay = max(self.expires - ExpiryMargin - time.time(), 0)
+        self._refresh_timer = threading.Timer(delay, run)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+
+#################################################
+#              Helpers
+#################################################
+def token_expiry(token):
+    return SecurityTokenContainer(None, token).get_jwt()['exp']
+
+
+def delegation_token_hash(delegation_token):
+    return hashlib.sha256(delegation_token.encode("utf-8")).hexdigest() if delegation_token else ""
+
+
+def principal_id():
+    """
+    Identifies the machine the token was issued to, so a cache file on a
+    shared home directory or a rebuilt instance is not reused
+    """
+    for machine_id_file in ("/etc/machine-id", "/var/lib/dbus/machine-id"):
+        try:
+            with open(machine_id_file, "r") as f:
+                machine_id = f.read().strip()
+            if machine_id:
+                return machine_id
+        except OSError:
+            pass
+    return socket.getfqdn()
+
+
+def signer_token_and_key(signer):
+    """Return the current security token and session private key of an SDK token signer"""
+    return signer.federation_client.get_security_token(), signer.session_key_supplier.get_key_pair()['private']
+
+
+#################################################
+#              LoadTokenCache
+# Returns the cache entry if it is private to this user, matches the
+# machine and auth method and is not about to expire, otherwise None
+#################################################
+def LoadTokenCache(cache_file, auth, delegation_token=None):
+    try:
+        st = os.stat(cache_file)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print("Warning: cannot read token cache {}: {}".format(cache_file, e))
+        return None
+
+    if (hasattr(os, "getuid") and st.st_uid != os.getuid()) or stat.S_IMODE(st.st_mode) & 0o077:
+        print("Warning: token cache {} is not private to the current user, ignoring it".format(cache_file))
+        return None
+
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry.get("principal") != principal_id():
+            return None
+        if entry.get("auth") != auth or entry.get("delegation_token_hash", "") != delegation_token_hash(delegation_token):
+            return None
+        if entry["expires"] - ExpiryMargin <= time.time():
+            return None
+        entry["private_key"] = oci.signer.load_private_key(entry["private_key"], None)
+        return entry
+    except Exception as e:
+        print("Warning: token cache {} is unreadable, ignoring it: {}".format(cache_file, e))
+        return None
+
+
+#################################################
+#              SaveTokenCache
+# Written atomically with 0600 permissions in a 0700 directory
+#################################################
+def SaveTokenCache(cache_file, auth, token, private_key, region, tenancy, delegation_token=None):
+    entry = {
+        "principal": principal_id(),
+        "auth": auth,
+        "token": token,
+        "private_key": private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ).decode("ascii"),
+        "region": region,
+        "tenancy": tenancy,
+        "delegation_token_hash": delegation_token_hash(delegation_token),
+        "expires": token_expiry(token),
+    }
+
+    tmp_file = None
+    try:
+        cache_dir = os.path.dirname(os.path.abspath(cache_file))
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        # mkstemp creates the file with 0600 permissions
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, prefix=".token-cache-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_file, cache_file)
+        tmp_file = None
+    except Exception as e:
+        print("Warning: unable to write token cache {}: {}".format(cache_file, e))
+    finally:
+        if tmp_file and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    return entry["expires"]
+
+
+#################################################
+#              RefreshTokenCache
+# Obtains a new token from the metadata/auth endpoints and caches it
+# Output - the SDK signer, token, session private key and expiry
+#################################################
+def RefreshTokenCache(cache_file, auth, delegation_token=None):
+    if delegation_token:
+        signer = oci.auth.signers.InstancePrincipalsDelegationTokenSigner(delegation_token=delegation_token)
+    else:
+        signer = oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
+    token, private_key = signer_token_and_key(signer)
+    expires = SaveTokenCache(cache_file, auth, token, private_key, signer.region, signer.tenancy_id, delegation_token)
+    return signer, token, private_key, expires
+
+
+#################################################
+#              RemoveTokenCache
+#################################################
+def RemoveTokenCache(cache_file):
+    try:
+        os.remove(cache_file)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print("Warning: unable to remove token cache {}: {}".format(cache_file, e))
+
+
+#################################################
+#              GetCachedSigner
+# Returns (region, tenancy, signer) from the cached token, or from a new
+# token that is cached when there is no usable one. The signer refreshes
+# its token and the cache in the background before it expires.
+#################################################
+def GetCachedSigner(cache_file, auth, delegation_token=None):
+    def refresh():
+        return RefreshTokenCache(cache_file, auth, delegation_token)[1:]
+
+    entry = LoadTokenCache(cache_file, auth, delegation_token)
+    if entry:
+        print("Using cached security token from " + cache_file)
+        token, private_key, expires, region, tenancy = entry["token"], entry["private_key"], entry["expires"], entry["region"], entry["tenancy"]
+    else:
+        print("Caching security token in " + cache_file)
+        sdk_signer, token, private_key, expires = RefreshTokenCache(cache_file, auth, delegation_token)
+        region, tenancy = sdk_signer.region, sdk_signer.tenancy_id
+
+    signer = CachedSecurityTokenSigner(token, private_key, expires, region, tenancy, refresh, cache_file, delegation_token)
+    signer.start_background_refresh()
+    return region, tenancy, signer